@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header
 from starlette.responses import JSONResponse
 
+from app.api.limits import route_limiter
 from app.api.schemas import AddData
 from app.dao.base import Repository, get_session
 
 
 add_router = APIRouter(tags=['Add data'], prefix='/add')
 
-@add_router.post("/add_data/", response_model=dict, status_code=201)
-async def add_data_route(data: AddData, session: Repository = Depends(get_session)):
-    """Эндпоинт для ввода тестовых данных в бд"""
-    await session.add_data(data)
-    return JSONResponse(status_code=201, content={"message": "Data added successfully"})
+@add_router.post("/add_data/", response_model=dict, status_code=201,
+                 dependencies=[Depends(route_limiter("add_data"))])
+async def add_data_route(data: AddData, session: Repository = Depends(get_session),
+                         idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    """Эндпоинт для ввода тестовых данных в бд.
+    Повторы с тем же заголовком Idempotency-Key не создают дубликатов"""
+    content, created = await session.add_data(data, idempotency_key)
+    return JSONResponse(status_code=201 if created else 200, content=content)
 
 
 
@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi import Depends, HTTPException, Query
+from loguru import logger
+
+from app.api.schemas import Radius
+from app.config import settings
+
+
+class ConcurrencyLimiter:
+    """Семафор с очередью ожидания для одного эндпоинта"""
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _overloaded(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        logger.warning(f"Rejected request to {self.name}: {reason}")
+        return HTTPException(
+            status_code=503,
+            detail=f"Endpoint {self.name} is overloaded, try again later",
+            headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)}
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Занимает слот семафора, ожидая его не дольше queue_timeout"""
+        if self.waiting >= self.max_queue:
+            raise self._overloaded("queue is full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._overloaded("queue timeout")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    async def __call__(self):
+        """Зависимость FastAPI: держит слот семафора на время обработки запроса"""
+        async with self.slot():
+            yield
+
+    def after(self, cost: Callable) -> Callable:
+        """Зависимость, которая встаёт в очередь только после оценки стоимости запроса.
+        Если cost не прошёл валидацию или отклонил запрос, FastAPI не вызывает её вовсе"""
+        async def admit(_: Any = Depends(cost)):
+            async with self.slot():
+                yield
+        return admit
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "rejected": self.rejected,
+        }
+
+
+limiters: Dict[str, ConcurrencyLimiter] = {}
+
+
+def route_limiter(name: str) -> ConcurrencyLimiter:
+    """Возвращает ограничитель эндпоинта, лимит берётся из настроек"""
+    if name not in limiters:
+        limiters[name] = ConcurrencyLimiter(
+            name=name,
+            limit=settings.ROUTE_CONCURRENCY_LIMITS.get(name, settings.DEFAULT_CONCURRENCY_LIMIT),
+            max_queue=settings.MAX_QUEUE_SIZE,
+            queue_timeout=settings.QUEUE_TIMEOUT_SECONDS,
+        )
+    return limiters[name]
+
+
+def page_params(limit: int = Query(settings.MAX_PAGE_SIZE, ge=1), offset: int = Query(0, ge=0)) -> Tuple[int, int]:
+    """Слишком большие страницы урезаются до MAX_PAGE_SIZE, применённый размер отдаётся в заголовке X-Page-Limit"""
+    return min(limit, settings.MAX_PAGE_SIZE), offset
+
+
+def radius_cost(data: Radius) -> Radius:
+    """Отклоняет поиск по радиусу, который затронет слишком большую часть карты"""
+    if data.radius > settings.MAX_RADIUS_KM:
+        raise HTTPException(status_code=422, detail=f"Radius must not exceed {settings.MAX_RADIUS_KM} km")
+    return data
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from app.api.limits import limiters
+
+metrics_router = APIRouter(tags=["Metrics"], prefix="/metrics")
+
+
+@metrics_router.get("/limits")
+async def get_limits():
+    """Эндпоинт для получения лимитов и текущей очереди каждого эндпоинта"""
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -1,8 +1,7 @@
 
 from typing import List
 
-from pydantic import BaseModel
-from pydantic.v1 import Field
+from pydantic import BaseModel, Field
 class SecondNestedActivity(BaseModel):
     name: str
     sub_activities: List["SecondNestedActivity"]
@@ -24,6 +23,6 @@ class AddData(BaseModel):
 
 
 class Radius(BaseModel):
-    radius: int
+    radius: int = Field(gt=0)
     latitude: float
     longitude: float
\ No newline at end of file
@@ -1,4 +1,5 @@
 
+from typing import Dict
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,6 +8,20 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # Сколько часов хранится ключ идемпотентности добавления данных
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+
+    # Ограничение одновременных запросов на эндпоинт (имя функции эндпоинта -> лимит)
+    DEFAULT_CONCURRENCY_LIMIT: int = 32
+    ROUTE_CONCURRENCY_LIMITS: Dict[str, int] = {"get_all": 2, "get_by_radius": 4}
+    QUEUE_TIMEOUT_SECONDS: float = 2.0
+    MAX_QUEUE_SIZE: int = 64
+    RETRY_AFTER_SECONDS: int = 1
+
+    # Оценка стоимости запроса
+    MAX_PAGE_SIZE: int = 100
+    MAX_RADIUS_KM: float = 1000.0
+
     model_config = SettingsConfigDict(
         env_file=".env")
 
@@ -1,30 +1,44 @@
 from abc import ABC, abstractmethod
-from math import acos, sin, radians, cos
-from typing import  Sequence, Any, Union
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from math import acos, asin, sin, radians, cos, degrees
+from typing import  Sequence, Any, Union, Optional
 
 from fastapi import Depends, HTTPException
 from loguru import logger
 from pydantic import BaseModel
 
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, delete, update, exists, or_, func
+from sqlalchemy.dialects import postgresql, sqlite
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import JSONResponse
 
 from app.api.schemas import AddData, NestedActivity, SecondNestedActivity
+from app.config import settings
 from app.dao.database import get_async_session
-from app.dao.models import Organization, Building, Activity
+from app.dao.models import Organization, Building, Activity, IdempotencyKey
+
+
+def get_dialect_insert(session: AsyncSession):
+    """Возвращает insert() диалекта текущей бд с поддержкой ON CONFLICT"""
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upserts are not supported for dialect {dialect_name}")
 
 
 class BaseRepository(ABC):
     """Абстрактный класс для основного репозитория"""
     @abstractmethod
-    async def add_data(self, data: AddData):
+    async def add_data(self, data: AddData, idempotency_key: Optional[str] = None):
         pass
 
     @abstractmethod
-    async def get_organizations(self):
+    async def get_organizations(self, limit: int, offset: int = 0):
         pass
 
     @abstractmethod
@@ -55,29 +69,94 @@ class Repository(BaseRepository):
         self._session = session
 
 
-    async def add_data(self, data: AddData):
-        result= await self._session.execute(select(Organization).filter(Organization.name  == data.organization_name))
-        if result.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail=f"Organization {data.organization_name} already exists")
-        try:
+    async def add_data(self, data: AddData, idempotency_key: Optional[str] = None):
+        """Добавляем или обновляем организацию через INSERT ... ON CONFLICT.
 
-            building_stmt = insert(Building).values(
-                address=str(data.address),  # address should be a string, not float
+        Здания дедуплицируются по адресу и координатам, организации - по названию.
+        Повторный запрос с тем же idempotency_key ничего не пишет и возвращает исходный ответ.
+        Возвращает тело ответа и признак того, что организация была создана.
+        """
+        dialect_insert = get_dialect_insert(self._session)
+        request_hash = sha256(data.model_dump_json().encode()).hexdigest()
+        try:
+            if idempotency_key is not None:
+                # Просроченные ключи удаляются в отдельной короткой транзакции, чтобы конкурентные записи
+                # не ждали блокировок этих строк до конца добавления. Повтор с таким ключом считается новым запросом
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                await self._session.execute(
+                    delete(IdempotencyKey).filter(
+                        IdempotencyKey.created_at < now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+                    )
+                )
+                await self._session.commit()
+                # Ключ вставляется первым: конкурентный запрос с тем же ключом ждёт коммита этой транзакции
+                key_stmt = dialect_insert(IdempotencyKey).values(
+                    key=idempotency_key,
+                    request_hash=request_hash,
+                    created_at=now,
+                ).on_conflict_do_nothing(index_elements=["key"]).returning(IdempotencyKey.key)
+                key_result = await self._session.execute(key_stmt)
+                if key_result.scalar_one_or_none() is None:
+                    await self._session.rollback()
+                    stored = await self._session.get(IdempotencyKey, idempotency_key)
+                    if stored.request_hash != request_hash:
+                        raise HTTPException(
+                            status_code=409,
+                            detail=f"Idempotency key {idempotency_key} was already used with a different payload"
+                        )
+                    return {
+                        "message": stored.response_message,
+                        "organization_id": stored.organization_id,
+                    }, stored.response_status == 201
+
+            # no-op DO UPDATE нужен, чтобы RETURNING вернул id уже существующего здания
+            building_stmt = dialect_insert(Building).values(
+                address=str(data.address),
                 latitude=data.latitude,
                 longitude=data.longitude
             )
-            result = await self._session.execute(building_stmt)
-            building_id = result.inserted_primary_key[0]
-
+            building_stmt = building_stmt.on_conflict_do_update(
+                index_elements=["address", "latitude", "longitude"],
+                set_={"address": building_stmt.excluded.address},
+            ).returning(Building.id)
+            building_id = (await self._session.execute(building_stmt)).scalar_one()
+
+            # Здание, к которому организация была привязана до обновления
+            previous_building_id = (await self._session.execute(
+                select(Organization.building_id).filter(Organization.name == data.organization_name)
+            )).scalar_one_or_none()
+
+            organization_values = {
+                "name": data.organization_name,
+                "phone_numbers": data.phone_numbers,
+                "address": data.address,
+                "building_id": building_id,
+            }
+            # DO NOTHING + UPDATE вместо DO UPDATE, чтобы отличить новую организацию от обновлённой
+            organization_stmt = dialect_insert(Organization).values(**organization_values).on_conflict_do_nothing(
+                index_elements=["name"]
+            ).returning(Organization.id)
+            org_id = (await self._session.execute(organization_stmt)).scalar_one_or_none()
+            created = org_id is not None
+            if not created:
+                org_id = (await self._session.execute(
+                    update(Organization)
+                    .filter(Organization.name == data.organization_name)
+                    .values(**organization_values)
+                    .returning(Organization.id)
+                )).scalar_one()
+
+            # Удаляем прежнее здание, если на него больше никто не ссылается
+            if previous_building_id is not None and previous_building_id != building_id:
+                await self._session.execute(
+                    delete(Building).filter(
+                        Building.id == previous_building_id,
+                        ~exists().where(Organization.building_id == previous_building_id),
+                    )
+                )
 
-            organization_stmt = insert(Organization).values(
-                name=data.organization_name,
-                phone_numbers=data.phone_numbers,
-                address=data.address,
-                building_id=building_id,
-            )
-            org_result = await self._session.execute(organization_stmt)
-            org_id = org_result.inserted_primary_key[0]
+            # Дерево деятельностей заменяется целиком, чтобы повторная запись не плодила дубликаты
+            await self._session.execute(delete(Activity).filter(Activity.organization_id == org_id))
 
             # Рекурсивная функция для добавления активностей
             async def add_activity(nested_activity: Union[NestedActivity, SecondNestedActivity], parent_id: int = None, level: int = 0):
@@ -99,8 +178,24 @@ class Repository(BaseRepository):
             # Добавляем все корневые активности
             for activity in data.activity_names:
                 await add_activity(activity)
+
+            message = "Data added successfully" if created else "Data updated successfully"
+            if idempotency_key is not None:
+                await self._session.execute(
+                    update(IdempotencyKey)
+                    .filter(IdempotencyKey.key == idempotency_key)
+                    .values(
+                        organization_id=org_id,
+                        response_status=201 if created else 200,
+                        response_message=message,
+                    )
+                )
             await self._session.commit()
-            return {"message": "Data added successfully"}
+            return {"message": message, "organization_id": org_id}, created
+
+        except HTTPException:
+            await self._session.rollback()
+            raise
 
         except IntegrityError as e:
             await self._session.rollback()
@@ -113,14 +208,23 @@ class Repository(BaseRepository):
             raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 
-    async def get_organizations(self):
-        """Извлекаем все организации"""
+    async def get_organizations(self, limit: int, offset: int = 0):
+        """Извлекаем организации постранично, возвращаем страницу и общее количество организаций"""
         try:
-            result = await self._session.execute(select(Organization).order_by(Organization.name))
+            result = await self._session.execute(
+                select(Organization).order_by(Organization.name).limit(limit).offset(offset)
+            )
             organizations = result.scalars().all()
-            if not organizations:
+            if not organizations and offset == 0:
                 raise HTTPException(status_code=404, detail=f"There are no organizations available")
-            return await self.format_output(organizations)
+            # COUNT(*) нужен, только если страница заполнена целиком или оказалась за пределами списка
+            if 0 < len(organizations) < limit:
+                total = offset + len(organizations)
+            else:
+                total = (await self._session.execute(select(func.count()).select_from(Organization))).scalar_one()
+            return await self.format_output(organizations), total
+        except HTTPException:
+            raise
         except IntegrityError as e:
             await self._session.rollback()
             logger.error(f"IntegrityError: {e}")
@@ -156,40 +260,43 @@ class Repository(BaseRepository):
         # Радиус Земли в километрах
         earth_radius = 6371.0
 
-        # Сначала получаем все здания
-        buildings_query = select(Building)
+        # Одним запросом берём организации из зданий внутри описанного вокруг окружности прямоугольника
+        lat_delta = degrees(data.radius / earth_radius)
+        conditions = [Building.latitude.between(lat - lat_delta, lat + lat_delta)]
+        if abs(lat) + lat_delta < 90:
+            lon_delta = degrees(asin(min(1.0, sin(data.radius / earth_radius) / cos(radians(lat)))))
+            min_lon, max_lon = lon - lon_delta, lon + lon_delta
+            if min_lon < -180:
+                conditions.append(or_(Building.longitude >= min_lon + 360, Building.longitude <= max_lon))
+            elif max_lon > 180:
+                conditions.append(or_(Building.longitude >= min_lon, Building.longitude <= max_lon - 360))
+            else:
+                conditions.append(Building.longitude.between(min_lon, max_lon))
+        query = select(Organization, Building).join(Building, Organization.building_id == Building.id).filter(*conditions)
         try:
-            buildings_result = await self._session.execute(buildings_query)
-            buildings = buildings_result.scalars().all()
-
+            result = await self._session.execute(query)
 
             organizations_info = []
 
-            # Фильтруем только те здания, которые находятся в пределах заданного радиуса
-            for building in buildings:
+            # Отсекаем углы прямоугольника, оставляя только здания в пределах заданного радиуса
+            for org, building in result.all():
                 # вычисления радиуса поиска на поверхности Земли
                 distance = (
-                    acos(
+                    acos(min(1.0,
                         sin(radians(lat)) * sin(radians(building.latitude)) +
                         cos(radians(lat)) * cos(radians(building.latitude)) *
                         cos(radians(building.longitude) - radians(lon))
-                    ) * earth_radius
-            )
+                    )) * earth_radius
+                )
 
                 if distance <= data.radius:
-                    # Получаем организации, связанные со зданием
-                    organizations_query = select(Organization).filter(Organization.building_id == building.id)
-                    orgs_result = await self._session.execute(organizations_query)
-                    organizations = orgs_result.scalars().all()
-
-                    for org in organizations:
-                        organizations_info.append({
-                            "organization_name": org.name,
-                            "address": building.address if building else "Not specified",
-                            "phone_numbers": org.phone_numbers,
-                            "latitude": building.latitude if building else None,
-                            "longitude": building.longitude if building else None,
-                        })
+                    organizations_info.append({
+                        "organization_name": org.name,
+                        "address": building.address,
+                        "phone_numbers": org.phone_numbers,
+                        "latitude": building.latitude,
+                        "longitude": building.longitude,
+                    })
             return organizations_info
         except IntegrityError as e:
             await self._session.rollback()
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import Integer, String, Float, ForeignKey, JSON
+from sqlalchemy import Integer, String, Float, ForeignKey, JSON, Index, DateTime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.dao.database import Base
@@ -8,6 +9,10 @@ from app.dao.database import Base
 
 class Building(Base):
     __tablename__ = 'buildings'
+    # одно здание на пару адрес + координаты, используется как цель ON CONFLICT
+    __table_args__ = (
+        Index('ix_buildings_address_coordinates', 'address', 'latitude', 'longitude', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     address: Mapped[str] = mapped_column(String)
@@ -34,11 +39,24 @@ class Organization(Base):
     __tablename__ = 'organizations'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    name: Mapped[str] = mapped_column(String)
+    name: Mapped[str] = mapped_column(String, unique=True, index=True)
     phone_numbers: Mapped[List[str]] = mapped_column(JSON)
     address: Mapped[str] = mapped_column(String, nullable=False)
     building_id: Mapped[int] = mapped_column(Integer, ForeignKey('buildings.id'))
 
 
     building: Mapped[Building] = relationship('Building', back_populates='organizations')
-    activities: Mapped[List[Activity]] = relationship("Activity", back_populates="organization")
\ No newline at end of file
+    activities: Mapped[List[Activity]] = relationship("Activity", back_populates="organization")
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64))
+    organization_id: Mapped[int] = mapped_column(Integer, ForeignKey('organizations.id'), nullable=True)
+    # исходный ответ, который отдаётся при повторе запроса
+    response_status: Mapped[int] = mapped_column(Integer, nullable=True)
+    response_message: Mapped[str] = mapped_column(String, nullable=True)
+    # naive UTC, выставляется в коде: now() на PostgreSQL вернул бы время в поясе сессии
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
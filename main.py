@@ -3,12 +3,14 @@ from fastapi import FastAPI
 
 from app.api.add_router import add_router
 from app.api.main_router import main_router
+from app.api.metrics_router import metrics_router
 
 app = FastAPI()
 
 
 app.include_router(add_router)
 app.include_router(main_router)
+app.include_router(metrics_router)
 
 if __name__ == '__main__':
     uvicorn.run("main:app", host='localhost', port=8004, reload=True)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""upsert unique keys
+
+Revision ID: 3c1f7a9d2e54
+Revises: 865cffeb0f81
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '3c1f7a9d2e54'
+down_revision: Union[str, None] = '865cffeb0f81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Из организаций с одинаковым названием остаётся первая, дубликаты удаляются вместе с деятельностями,
+    # иначе одинаковые деревья деятельностей задвоились бы у оставшейся организации
+    op.execute("""
+        DELETE FROM activities WHERE organization_id NOT IN (
+            SELECT MIN(id) FROM organizations GROUP BY name
+        )
+    """)
+    op.execute("""
+        DELETE FROM organizations WHERE id NOT IN (
+            SELECT MIN(id) FROM organizations GROUP BY name
+        )
+    """)
+
+    # Перепривязываем организации к первому из одинаковых зданий и удаляем дубликаты
+    op.execute("""
+        UPDATE organizations SET building_id = (
+            SELECT MIN(b2.id) FROM buildings b1
+            JOIN buildings b2 ON b2.address = b1.address
+                AND b2.latitude = b1.latitude AND b2.longitude = b1.longitude
+            WHERE b1.id = organizations.building_id
+        )
+        WHERE building_id IS NOT NULL
+    """)
+    op.execute("""
+        DELETE FROM buildings WHERE id NOT IN (
+            SELECT MIN(id) FROM buildings GROUP BY address, latitude, longitude
+        )
+    """)
+    # Здания без организаций только замедляют поиск по радиусу
+    op.execute("""
+        DELETE FROM buildings WHERE NOT EXISTS (
+            SELECT 1 FROM organizations WHERE organizations.building_id = buildings.id
+        )
+    """)
+
+    # Уникальные индексы - цели для INSERT ... ON CONFLICT
+    op.create_index('ix_buildings_address_coordinates', 'buildings',
+                    ['address', 'latitude', 'longitude'], unique=True)
+    op.create_index('ix_organizations_name', 'organizations', ['name'], unique=True)
+
+    # Создание таблицы idempotency_keys
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('request_hash', sa.String(64), nullable=False),
+        sa.Column('organization_id', sa.Integer(), sa.ForeignKey('organizations.id'), nullable=True),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_message', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_idempotency_keys_created_at', 'idempotency_keys', ['created_at'])
+
+
+def downgrade():
+    # Удаление таблицы idempotency_keys
+    op.drop_table('idempotency_keys')
+
+    # Удаление уникальных индексов
+    op.drop_index('ix_organizations_name', table_name='organizations')
+    op.drop_index('ix_buildings_address_coordinates', table_name='buildings')